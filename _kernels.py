@@ -0,0 +1,201 @@
+import os
+import warnings
+import numpy as np
+from numba import njit, prange
+
+# sir_model_simulation.py and sir_vaccination_model.py use the ahead-of-time compiled copies of
+# runBasic and runVaccination when build_kernels.py has been run, so it must be re-run after any
+# change to this file (loadAheadOfTimeKernels ignores an extension older than this file).
+
+def loadAheadOfTimeKernels():
+    """
+    imports the sir_kernels extension module built by build_kernels.py
+
+    Returns:
+        sir_kernels : the extension module, or None if it has not been built or is older than _kernels.py
+                      (a warning is issued in that case and the JIT kernels should be used)
+
+    """
+
+    try:
+        import sir_kernels
+    except ImportError:
+        return None
+
+    if os.path.getmtime(sir_kernels.__file__) < os.path.getmtime(__file__):
+        warnings.warn('sir_kernels is older than _kernels.py, using the JIT kernels; re-run `python build_kernels.py`')
+        return None
+
+    return sir_kernels
+
+# agent states: the disease state is held in the low two bits and
+# the VACCINATED bit is set for vaccinated agents (vaccination never changes after initialisation)
+SUSCEPTIBLE, INFECTED, RECOVERED = 0, 1, 2
+DISEASE_MASK = 3
+VACCINATED = 4
+
+@njit(cache=True)
+def stepTwoAgent(agents, counts, groupSize, randomAgent1, randomAgent2, recoveryAgent, uInfection, uRecovery, β, γ, vaccinatedβ, vaccinatedγ):
+    """
+    performs one time step of the two-agent contact model shared by the simulation scripts
+
+    randomAgent1 and randomAgent2 come into contact, and if one is infected and the other
+    susceptible the susceptible agent is infected. recoveryAgent then recovers if it is infected.
+    agents and counts are updated in place.
+
+    Parameters:
+
+    agents : flat uint8 array of agent states
+    counts : (numGroups, 3) array of S/I/R counts per group, agent k belongs to group k // groupSize
+    groupSize : Number of agents per group (the population size for a single group)
+    randomAgent1, randomAgent2 : Indexes of the two agents that come into contact
+    recoveryAgent : Index of the agent selected for recovery
+    uInfection, uRecovery : Uniform random numbers in [0, 1) for the infection and recovery tests
+    β : Transmission rate
+    γ : Recovery rate
+    vaccinatedβ : Transmission rate to a vaccinated agent
+    vaccinatedγ : Recovery rate of a vaccinated agent
+
+    """
+
+    # infection from an infected to a susceptible agent (in either order).
+    # the contact test is branch-free, leaving a single branch on whether the contact can transmit
+    disease1 = agents[randomAgent1] & DISEASE_MASK
+    disease2 = agents[randomAgent2] & DISEASE_MASK
+    agent1Susceptible = disease1 == SUSCEPTIBLE
+    contact = (agent1Susceptible & (disease2 == INFECTED)) | ((disease1 == INFECTED) & (disease2 == SUSCEPTIBLE))
+    susceptible = randomAgent1 if agent1Susceptible else randomAgent2
+    prob = vaccinatedβ if agents[susceptible] & VACCINATED else β
+    newlyInfected = -1
+    if contact and uInfection < prob:
+        agents[susceptible] = (agents[susceptible] & VACCINATED) | INFECTED
+        newlyInfected = susceptible
+        counts[susceptible // groupSize, SUSCEPTIBLE] -= 1
+        counts[susceptible // groupSize, INFECTED] += 1
+
+    # recovery (an agent infected above cannot recover until the next time step)
+    prob = vaccinatedγ if agents[recoveryAgent] & VACCINATED else γ
+    if agents[recoveryAgent] & DISEASE_MASK == INFECTED and recoveryAgent != newlyInfected and uRecovery < prob:
+        agents[recoveryAgent] = (agents[recoveryAgent] & VACCINATED) | RECOVERED
+        counts[recoveryAgent // groupSize, INFECTED] -= 1
+        counts[recoveryAgent // groupSize, RECOVERED] += 1
+
+@njit(cache=True)
+def runBasicInto(s, i, r, β, γ, N, T, seed):
+    # simulation loop of the basic SIR model (sir_model_simulation.py), writes the trajectories into s, i and r
+    np.random.seed(seed)
+
+    t = 0 # starting time step
+
+    # initialise population with N-1 susceptibles and 1 infected
+    agents = np.zeros(N, np.uint8)
+    agents[-1] = INFECTED
+
+    # running population counts (a single group), updated on each state transition
+    counts = np.zeros((1, 3), np.int32)
+    counts[0, SUSCEPTIBLE], counts[0, INFECTED] = N-1, 1
+
+    # track the population counts for s, i, and r over each time step
+    s[0], i[0], r[0] = counts[0, SUSCEPTIBLE], counts[0, INFECTED], counts[0, RECOVERED]
+
+    # draw the random numbers for every time step up front: the contact pair, the agent
+    # chosen for recovery and the uniforms for the infection and recovery tests
+    randomAgents1 = np.random.randint(0, N, T)
+    randomAgents2 = np.random.randint(0, N - 1, T)
+    recoveryAgents = np.random.randint(0, N, T)
+    uniforms = np.random.random((T, 2))
+    
+    while t < T:
+
+        # two distinct random indexes (agents): the second is drawn from the N-1 other agents
+        randomAgent1 = randomAgents1[t]
+        randomAgent2 = randomAgents2[t]
+        if randomAgent2 >= randomAgent1:
+            randomAgent2 += 1
+
+        # infection with probability β if one agent is susceptible and the other infected,
+        # then recovery of the chosen agent with probability γ if it is infected
+        stepTwoAgent(agents, counts, N, randomAgent1, randomAgent2, recoveryAgents[t], uniforms[t, 0], uniforms[t, 1], β, γ, β, γ)
+        
+        # increment time step
+        t += 1
+
+        # update counts
+        s[t], i[t], r[t] = counts[0, SUSCEPTIBLE], counts[0, INFECTED], counts[0, RECOVERED]
+
+    # population change indicates logical error
+    assert counts.sum() == N
+
+@njit(cache=True)
+def runVaccinationInto(s, i, r, β, γ, N, T, v, seed):
+    # simulation loop of the vaccination model (sir_vaccination_model.py), writes the trajectories into s, i and r
+    np.random.seed(seed)
+
+    t = 0
+
+    agents = np.zeros(N, np.uint8)
+    agents[-1] = INFECTED
+    
+    # Vaccinate the susceptible agents with probability v
+    agents[:-1] = np.where(np.random.random(N-1) < v, SUSCEPTIBLE | VACCINATED, SUSCEPTIBLE)
+
+    # running population counts (a single group), updated on each state transition
+    counts = np.zeros((1, 3), np.int32)
+    counts[0, SUSCEPTIBLE], counts[0, INFECTED] = N-1, 1
+
+    s[0], i[0], r[0] = counts[0, SUSCEPTIBLE], counts[0, INFECTED], counts[0, RECOVERED]
+
+    # draw the random numbers for every time step up front: the contact pair, the agent
+    # chosen for recovery and the uniforms for the infection and recovery tests
+    randomAgents1 = np.random.randint(0, N, T)
+    randomAgents2 = np.random.randint(0, N - 1, T)
+    recoveryAgents = np.random.randint(0, N, T)
+    uniforms = np.random.random((T, 2))
+
+    while t < T:
+        # two distinct random indexes (agents): the second is drawn from the N-1 other agents
+        randomAgent1 = randomAgents1[t]
+        randomAgent2 = randomAgents2[t]
+        if randomAgent2 >= randomAgent1:
+            randomAgent2 += 1
+
+        # a vaccinated agent is infected with a third of the probability and recovers twice as fast
+        stepTwoAgent(agents, counts, N, randomAgent1, randomAgent2, recoveryAgents[t], uniforms[t, 0], uniforms[t, 1], β, γ, β / 3, γ * 2)
+        
+        t += 1
+        s[t], i[t], r[t] = counts[0, SUSCEPTIBLE], counts[0, INFECTED], counts[0, RECOVERED]
+
+    # population change indicates logical error
+    assert counts.sum() == N
+
+@njit(cache=True)
+def runBasic(β, γ, N, T, seed):
+    # single run of the basic SIR model, rows 0, 1 and 2 hold the s, i and r trajectories
+    counts = np.empty((3, T + 1), np.int32)
+    runBasicInto(counts[0], counts[1], counts[2], β, γ, N, T, seed)
+    return counts
+
+@njit(parallel=True, cache=True)
+def runBasicEnsemble(β, γ, N, T, numSimulations, seed):
+    # numSimulations runs of the basic SIR model, run k is seeded with seed + k.
+    # counts[0, k], counts[1, k] and counts[2, k] hold the s, i and r trajectories of run k
+    counts = np.empty((3, numSimulations, T + 1), np.int32)
+    for k in prange(numSimulations):
+        runBasicInto(counts[0, k], counts[1, k], counts[2, k], β, γ, N, T, seed + k)
+    return counts
+
+@njit(cache=True)
+def runVaccination(β, γ, N, T, v, seed):
+    # single run of the vaccination model, rows 0, 1 and 2 hold the s, i and r trajectories
+    counts = np.empty((3, T + 1), np.int32)
+    runVaccinationInto(counts[0], counts[1], counts[2], β, γ, N, T, v, seed)
+    return counts
+
+@njit(parallel=True, cache=True)
+def runVaccinationEnsemble(β, γ, N, T, v, numSimulations, seed):
+    # numSimulations runs of the vaccination model, run k is seeded with seed + k.
+    # counts[0, k], counts[1, k] and counts[2, k] hold the s, i and r trajectories of run k
+    counts = np.empty((3, numSimulations, T + 1), np.int32)
+    for k in prange(numSimulations):
+        runVaccinationInto(counts[0, k], counts[1, k], counts[2, k], β, γ, N, T, v, seed + k)
+    return counts
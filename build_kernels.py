@@ -0,0 +1,15 @@
+import os
+from numba.pycc import CC
+from _kernels import runBasic, runVaccination
+
+# ahead-of-time compiles the single-run kernels of sir_model_simulation.py and sir_vaccination_model.py
+# into the sir_kernels C extension module. run `python build_kernels.py` once, and again after any change
+# to _kernels.py. the ensembles are not exported: pycc compiles without parallel=True, so they stay JIT compiled.
+cc = CC('sir_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export('runBasic', 'i4[:,:](f8, f8, i8, i8, i8)')(runBasic.py_func)
+cc.export('runVaccination', 'i4[:,:](f8, f8, i8, i8, f8, i8)')(runVaccination.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -1,9 +1,9 @@
-import random
 import numpy as np
 import matplotlib.pyplot as plt
-import copy
+from numba import njit, prange, get_num_threads
+from _kernels import SUSCEPTIBLE, INFECTED, RECOVERED, stepTwoAgent
 
-def runVillageSimulation(β: float, γ: float, N: int, T: int, v: int) -> tuple[list[list[int]], list[list[int]], list[list[int]]]:
+def runVillageSimulation(β: float, γ: float, N: int, T: int, v: int, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Simulates the spread of an infectius disease in multiple villages
 
@@ -13,73 +13,128 @@ def runVillageSimulation(β: float, γ: float, N: int, T: int, v: int) -> tuple[
     N: total population size
     T: end time-step
     v: number of supopulations (i.e., number of different villages)
+    seed: seed for the random number generator (drawn at random if None)
 
     Returns:
-    Tuple[List[int], List[int], List[int]]: 
-        - s: time series of the total susceptible population.
-        - i: time series of the total infected population.
-        - r: time series of the total recovered population.
+    Tuple[np.ndarray, np.ndarray, np.ndarray]: 
+        - sv: (T+1, v) array, the susceptible count of each village at each time step.
+        - iv: (T+1, v) array, the infected count of each village at each time step.
+        - rv: (T+1, v) array, the recovered count of each village at each time step.
     """
 
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    sv = np.zeros((T + 1, v), np.int32)
+    iv = np.zeros((T + 1, v), np.int32)
+    rv = np.zeros((T + 1, v), np.int32)
+    _runInto(sv, iv, rv, β, γ, N, T, v, seed)
+    return sv, iv, rv
+
+def runVillageEnsemble(β: float, γ: float, N: int, T: int, v: int, numSimulations: int, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs numSimulations independent village simulations in parallel and sums their counts
+
+    Parameters:
+    β: transmission rate
+    γ: recovery rate
+    N: total population size
+    T: end time-step
+    v: number of supopulations (i.e., number of different villages)
+    numSimulations: number of simulation runs
+    seed: base seed, run k is seeded with seed + k (drawn at random if None)
+
+    Returns:
+    Tuple[np.ndarray, np.ndarray, np.ndarray]: 
+        - sTotal: (T+1, v) array, the susceptible counts summed over all runs.
+        - iTotal: (T+1, v) array, the infected counts summed over all runs.
+        - rTotal: (T+1, v) array, the recovered counts summed over all runs.
+    """
+
+    if seed is None:
+        seed = np.random.randint(2**31 - 1 - numSimulations)
+
+    numChunks = min(get_num_threads(), numSimulations)
+    return _runEnsemble(β, γ, N, T, v, numSimulations, numChunks, seed)
+
+@njit(parallel=True, cache=True)
+def _runEnsemble(β, γ, N, T, v, numSimulations, numChunks, seed):
+    # the runs are split into numChunks interleaved chunks, each with its own accumulator,
+    # so chunks running on different threads never write to the same memory
+    sAcc = np.zeros((numChunks, T + 1, v))
+    iAcc = np.zeros((numChunks, T + 1, v))
+    rAcc = np.zeros((numChunks, T + 1, v))
+    for chunk in prange(numChunks):
+        for k in range(chunk, numSimulations, numChunks):
+            _runInto(sAcc[chunk], iAcc[chunk], rAcc[chunk], β, γ, N, T, v, seed + k)
+    return sAcc.sum(axis=0), iAcc.sum(axis=0), rAcc.sum(axis=0)
+
+@njit(cache=True)
+def _runInto(sAcc, iAcc, rAcc, β, γ, N, T, v, seed):
+    # compiled simulation loop, adds the counts of each village at each time step into sAcc, iAcc and rAcc
+    np.random.seed(seed)
+
     t = 0
     
-    # Creating v villages with (N//v) agents each (all susceptible initially)
-    agents = [['S'] * (N // v) for _ in range(v)]
+    # Creating v villages with (N//v) agents each (all susceptible initially).
+    # the villages are stored back to back, agent j of village k is at index k*(N//v) + j
+    agents = np.zeros(v * (N // v), np.uint8)
     
     # Randomly infect one agent in one village
     randomVillage = 0
-    randomAgent = random.randint(0, (N // v) - 1)
-    agents[randomVillage][randomAgent] = 'I'
+    randomAgent = np.random.randint(0, N // v)
+    agents[randomVillage * (N // v) + randomAgent] = INFECTED
+    
+    # running population counts per village (row k holds the S/I/R counts of village k), updated on each state transition
+    counts = np.zeros((v, 3), np.int32)
+    counts[:, SUSCEPTIBLE] = N // v
+    counts[randomVillage, SUSCEPTIBLE] -= 1
+    counts[randomVillage, INFECTED] += 1
     
-    # track population counts per village over time.
-    # each element is a list of counts for the v villages at that time step.
-    sv = [ [row.count('S') for row in agents] ]
-    iv = [ [row.count('I') for row in agents] ]
-    rv = [ [row.count('R') for row in agents] ]
+    # row t of the accumulators collects the counts for the v villages at time step t.
+    sAcc[0] += counts[:, SUSCEPTIBLE]
+    iAcc[0] += counts[:, INFECTED]
+    rAcc[0] += counts[:, RECOVERED]
     
     while t < T:
-        newAgents = copy.deepcopy(agents)
-        
         # pick a random agent
-        randomAgent1VillageIdx = random.randint(0, v - 1)
-        randomAgent1Idx = random.randint(0, (N // v) - 1)
+        randomAgent1VillageIdx = np.random.randint(0, v)
+        randomAgent1Idx = np.random.randint(0, N // v)
         
         # Select a second agent with 10% probability from a different village, otherwise same village
-        if random.random() < 0.1:
-            randomAgent2VillageIdx = random.randint(0, v - 1)
-            randomAgent2Idx = random.randint(0, (N // v) - 1)
+        if np.random.random() < 0.1:
+            randomAgent2VillageIdx = np.random.randint(0, v)
+            randomAgent2Idx = np.random.randint(0, N // v)
         else:
             randomAgent2VillageIdx = randomAgent1VillageIdx
-            possibleIndices = list(range(N // v))
+            # a different agent from the same village, drawn uniformly from the other (N // v) - 1 agents
             if (N // v) > 1:
-                possibleIndices.remove(randomAgent1Idx)
-            randomAgent2Idx = random.choice(possibleIndices)
-        
-        randomAgent1 = agents[randomAgent1VillageIdx][randomAgent1Idx]
-        randomAgent2 = agents[randomAgent2VillageIdx][randomAgent2Idx]
-        
-        # if one is infected and the other is susceptible
-        if randomAgent1 == 'I' and randomAgent2 == 'S' and random.random() < β:
-            newAgents[randomAgent2VillageIdx][randomAgent2Idx] = 'I'
-        elif randomAgent1 == 'S' and randomAgent2 == 'I' and random.random() < β:
-            newAgents[randomAgent1VillageIdx][randomAgent1Idx] = 'I'
+                randomAgent2Idx = np.random.randint(0, (N // v) - 1)
+                if randomAgent2Idx >= randomAgent1Idx:
+                    randomAgent2Idx += 1
+            else:
+                randomAgent2Idx = randomAgent1Idx
         
         # randomly selecting an agent for potential recovery
-        randomRecoveryVillage = random.randint(0, v - 1)
-        randomRecoveryAgent = random.randint(0, (N // v) - 1)
-        if agents[randomRecoveryVillage][randomRecoveryAgent] == 'I' and random.random() < γ:
-            newAgents[randomRecoveryVillage][randomRecoveryAgent] = 'R'
+        randomRecoveryVillage = np.random.randint(0, v)
+        randomRecoveryAgent = np.random.randint(0, N // v)
         
-        agents = newAgents
-        t += 1
+        # infection with probability β if one is infected and the other is susceptible,
+        # then recovery with probability γ (an agent infected in this step cannot recover yet)
+        stepTwoAgent(agents, counts, N // v,
+                     randomAgent1VillageIdx * (N // v) + randomAgent1Idx,
+                     randomAgent2VillageIdx * (N // v) + randomAgent2Idx,
+                     randomRecoveryVillage * (N // v) + randomRecoveryAgent,
+                     np.random.random(), np.random.random(),
+                     β, γ, β, γ)
         
-        sv.append([row.count('S') for row in agents])
-        iv.append([row.count('I') for row in agents])
-        rv.append([row.count('R') for row in agents])
+        t += 1
         
-        assert sum(sv[-1]) + sum(iv[-1]) + sum(rv[-1]) == N
+        sAcc[t] += counts[:, SUSCEPTIBLE]
+        iAcc[t] += counts[:, INFECTED]
+        rAcc[t] += counts[:, RECOVERED]
     
-    return sv, iv, rv
+    assert counts.sum() == N
 
 β = 0.6 # transmission rate 
 γ = 0.1 # recovery rate
@@ -88,15 +143,7 @@ T = 2500 # number of time steps
 v = 3 # number of villages
 numSimulations = 50 # number of simulation runs
 
-sTotal = np.zeros((T+1, v))
-iTotal = np.zeros((T+1, v))
-rTotal = np.zeros((T+1, v))
-
-for sim in range(numSimulations):
-    sv, iv, rv = runVillageSimulation(β, γ, N, T, v=v)
-    sTotal += np.array(sv)
-    iTotal += np.array(iv)
-    rTotal += np.array(rv)
+sTotal, iTotal, rTotal = runVillageEnsemble(β, γ, N, T, v, numSimulations)
 
 # compute averages
 sAvg = sTotal / numSimulations
@@ -1,9 +1,204 @@
-import random
 import numpy as np
 import matplotlib.pyplot as plt
-import copy
+from numba import njit, prange
+from numba.cpython.unsafe.numbers import trailing_zeros
 
-def latticeSimulation(β: float, γ: float, N: int, T: int) -> tuple[list[int], list[int], list[int]]:
+# random number generator (PCG64) used only to draw the base seeds of the compiled simulations,
+# which draw their random numbers from numba's per-thread np.random
+rng = np.random.default_rng()
+
+# compiled lattice kernels and ensemble drivers, keyed by grid size
+_latticeKernels = {}
+_latticeEnsembles = {}
+
+@njit(cache=True)
+def infectedNeighbourPlanes(words: np.ndarray, row: int, w: int) -> tuple[np.uint64, np.uint64, np.uint64]:
+    """
+    counts the infected neighbours (4-connectivity, no wrap-around) of the 64 cells in one word of a bit-packed lattice row
+
+    The four neighbour bit-planes of the word are summed with bitwise half adders,
+    so every word operation handles 64 cells.
+
+    Parameters:
+
+    words : (rows + 2, numWords) uint64 array, bit j % 64 of words[k + 1, j // 64] is set if cell (k, j)
+            is infected. the first and last rows are zero padding
+    row : Lattice row of the word
+    w : Index of the word within the row
+
+    Returns:
+        bit0, bit1, bit2 : bit-planes of the counts, cell j of the word has bit0_j + 2*bit1_j + 4*bit2_j infected neighbours
+
+    """
+
+    one, sixtyThree = np.uint64(1), np.uint64(63)
+    numWords = words.shape[1]
+
+    # neighbour bit-planes: bit j of left is set if cell j-1 is infected, and so on.
+    # the horizontal shifts carry bits across word boundaries
+    word = words[row + 1, w]
+    left = word << one
+    right = word >> one
+    if w > 0:
+        left |= words[row + 1, w - 1] >> sixtyThree
+    if w < numWords - 1:
+        right |= words[row + 1, w + 1] << sixtyThree
+    up = words[row, w]
+    down = words[row + 2, w]
+
+    # add the four planes, giving a 3-bit count per cell (bit0 + 2*bit1 + 4*bit2)
+    sum1, carry1 = left ^ right, left & right
+    sum2, carry2 = up ^ down, up & down
+    bit0 = sum1 ^ sum2
+    carry3 = sum1 & sum2
+    bit1 = carry1 ^ carry2 ^ carry3 # carry3 is only set when carry1 and carry2 are not
+    bit2 = carry1 & carry2
+    return bit0, bit1, bit2
+
+@njit(cache=True)
+def _bitCount(words):
+    # number of set bits in an array of uint64 words
+    one = np.uint64(1)
+    count = 0
+    for word in words.ravel():
+        while word:
+            word &= word - one
+            count += 1
+    return count
+
+@njit(cache=True, inline='always')
+def _latticeInto(s, i, r, β, γ, N, T, seed):
+    # compiled simulation loop of the lattice model, writes the trajectories into s, i and r.
+    # it is inlined into the per-grid-size kernels of makeLatticeKernel and makeLatticeEnsemble,
+    # where N is a compile-time constant
+    np.random.seed(seed)
+    one, two = np.uint64(1), np.uint64(2)
+
+    # the susceptible and infected agents are held as bit-packed rows (recovered agents are in neither):
+    # agent (row, col) is bit col % 64 of word [row + 1, col // 64]. the first and last rows are zero padding
+    numWords = (N + 63) // 64
+    susceptibleWords = np.zeros((N + 2, numWords), np.uint64)
+    infectedWords = np.zeros((N + 2, numWords), np.uint64)
+    startInfectedWords = np.zeros((N + 2, numWords), np.uint64)
+    for row in range(1, N + 1):
+        for w in range(numWords):
+            cells = min(64, N - 64 * w)
+            susceptibleWords[row, w] = ~np.uint64(0) if cells == 64 else (one << np.uint64(cells)) - one
+
+    # initialisation - everyone is susceptible except one infected agent
+    randomRow = np.random.randint(N)
+    randomCol = np.random.randint(N)
+    bit = one << np.uint64(randomCol % 64)
+    susceptibleWords[randomRow + 1, randomCol // 64] &= ~bit
+    infectedWords[randomRow + 1, randomCol // 64] |= bit
+    nS, nI, nR = N * N - 1, 1, 0
+
+    s[0], i[0], r[0] = nS, nI, nR
+
+    # each infected neighbour transmits independently with probability β,
+    # so a susceptible agent with k infected neighbours is infected with probability 1-(1-β)^k (k = 0..4)
+    infectionProbByNeighbours = 1 - (1 - β) ** np.arange(5)
+
+    for t in range(T):
+
+        # infected agents at the start of the time step (agents infected in this time step
+        # neither transmit nor recover until the next one)
+        startInfectedWords[:] = infectedWords
+
+        for row in range(N):
+            for w in range(numWords):
+                bit0, bit1, bit2 = infectedNeighbourPlanes(startInfectedWords, row, w)
+
+                # only susceptible agents with an infected neighbour and infected agents can change state,
+                # so only their bits are visited (in column order)
+                exposed = (bit0 | bit1 | bit2) & susceptibleWords[row + 1, w]
+                active = exposed | startInfectedWords[row + 1, w]
+                while active:
+                    j = trailing_zeros(active)
+                    bit = one << j
+                    active &= active - one
+                    if exposed & bit:
+                        k = ((bit0 >> j) & one) | (((bit1 >> j) & one) << one) | (((bit2 >> j) & one) << two)
+                        if np.random.random() < infectionProbByNeighbours[k]:
+                            susceptibleWords[row + 1, w] &= ~bit
+                            infectedWords[row + 1, w] |= bit
+                            nS -= 1
+                            nI += 1
+                    elif np.random.random() < γ:
+                        infectedWords[row + 1, w] &= ~bit
+                        nI -= 1
+                        nR += 1
+
+        # record the counts after this timestep
+        s[t + 1], i[t + 1], r[t + 1] = nS, nI, nR
+
+    # the running counts must match the grid, otherwise there is a logical error.
+    # the check is returned rather than asserted, since an assertion inside a prange loop stops it running in parallel
+    return (_bitCount(susceptibleWords) == nS and _bitCount(infectedWords) == nI
+            and not (susceptibleWords & infectedWords).any() and nS + nI + nR == N * N)
+
+def makeLatticeKernel(N: int):
+    """
+    builds a lattice simulation kernel specialised for an N x N grid
+
+    N is a closure constant of the compiled kernel, so the grid shape and loop bounds are
+    compile-time constants. Kernels are cached per grid size and reused across runs.
+
+    Parameters:
+
+    N : Lattice width (N x N agents)
+
+    Returns:
+        kernel : compiled function kernel(s, i, r, β, γ, T, seed) writing the s, i and r trajectories into s, i and r
+
+    """
+
+    kernel = _latticeKernels.get(N)
+    if kernel is not None:
+        return kernel
+
+    @njit(cache=True)
+    def kernel(s, i, r, β, γ, T, seed):
+        assert _latticeInto(s, i, r, β, γ, N, T, seed)
+
+    _latticeKernels[N] = kernel
+    return kernel
+
+def makeLatticeEnsemble(N: int):
+    """
+    builds a parallel ensemble driver for the N x N lattice, specialised like makeLatticeKernel
+
+    Parameters:
+
+    N : Lattice width (N x N agents)
+
+    Returns:
+        ensemble : compiled function ensemble(β, γ, T, runs, seed) returning (runs, T+1) arrays
+                   S, I and R with one row per run, run k is seeded with seed + k
+
+    """
+
+    ensemble = _latticeEnsembles.get(N)
+    if ensemble is not None:
+        return ensemble
+
+    # the closure only captures N: a captured dispatcher would change the
+    # numba cache key in every process, so the ensemble would never be loaded from the cache
+    @njit(parallel=True, cache=True)
+    def ensemble(β, γ, T, runs, seed):
+        S = np.empty((runs, T + 1), np.int32)
+        I = np.empty((runs, T + 1), np.int32)
+        R = np.empty((runs, T + 1), np.int32)
+        consistent = np.empty(runs, np.bool_)
+        for k in prange(runs):
+            consistent[k] = _latticeInto(S[k], I[k], R[k], β, γ, N, T, seed + k)
+        assert consistent.all()
+        return S, I, R
+
+    _latticeEnsembles[N] = ensemble
+    return ensemble
+
+def latticeSimulation(β: float, γ: float, N: int, T: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     simulates the spread of an infectious disease in a lattice network topology
 
@@ -15,61 +210,45 @@ def latticeSimulation(β: float, γ: float, N: int, T: int) -> tuple[list[int],
     T : End time-step
 
     Returns:
-        s : list containing the count of susceptible agents at each time step
-        i : list containing the count of infected agents at each time step
-        r : list containing the count of recovered agents at each time step 
+        s : array containing the count of susceptible agents at each time step
+        i : array containing the count of infected agents at each time step
+        r : array containing the count of recovered agents at each time step 
 
     """
 
-    t = 0 # initial time step
+    s = np.empty(T + 1, np.int32)
+    i = np.empty(T + 1, np.int32)
+    r = np.empty(T + 1, np.int32)
+    makeLatticeKernel(N)(s, i, r, β, γ, T, rng.integers(2**31 - 1))
+    return s, i, r
 
-    # initialisation - everyone is susceptible except one infected agent
-    agents = [['S' for _ in range(N)] for _ in range(N)]
-    randomRow = random.randint(0, N - 1)
-    randomCol = random.randint(0, N - 1)
-    agents[randomRow][randomCol] = 'I'
+def latticeEnsemble(β: float, γ: float, N: int, T: int, runs: int, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    runs independent lattice simulations in parallel
 
-    # trackers for each timestep
-    s = [N * N - 1]
-    i = [1]
-    r = [0]
+    Parameters:
 
-    # Run simulation for T timesteps
-    while t < T:
-        
-        newAgents = copy.deepcopy(agents)
-        neighbours = [(1, 0), (0, 1), (-1, 0), (0, -1)]
-        
-        # iterate through each agent in the grid
-        for rowIdx in range(N):
-            for colIdx in range(N):
-                if agents[rowIdx][colIdx] == 'I':
-                    # infecting susceptible neighbours
-                    for dr, dc in neighbours:
-                        ni, nj = rowIdx + dr, colIdx + dc
-                        if 0 <= ni < N and 0 <= nj < N and agents[ni][nj] == 'S':
-                            if random.random() < β:
-                                newAgents[ni][nj] = 'I'
-                    # Check for recovery
-                    if random.random() < γ:
-                        newAgents[rowIdx][colIdx] = 'R'
-        
-        agents = newAgents
-    
-        # record the counts after this timestep
-        s.append(sum(row.count('S') for row in agents))
-        i.append(sum(row.count('I') for row in agents))
-        r.append(sum(row.count('R') for row in agents))
+    β : Transmission rate
+    γ : Recovery rate
+    N : Lattice width (N x N agents)
+    T : End time-step
+    runs : Number of simulation runs
+    seed : Base seed, run k is seeded with seed + k (drawn at random if None)
 
+    Returns:
+        S : (runs, T+1) array of susceptible counts, one row per run
+        I : (runs, T+1) array of infected counts, one row per run
+        R : (runs, T+1) array of recovered counts, one row per run
 
-        assert sum(row.count('S') + row.count('I') + row.count('R') for row in agents)  == N*N
+    """
 
-        t += 1
-    
-    return s, i, r
+    if seed is None:
+        seed = rng.integers(2**31 - 1 - runs)
 
+    return makeLatticeEnsemble(N)(β, γ, T, runs, seed)
 
-def all_to_all_simulation(β: float, γ: float, N: int, T: int) -> tuple[list[int], list[int], list[int]]:
+
+def all_to_all_simulation(β: float, γ: float, N: int, T: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
 
     """
     simulates the spread of an infectious disease in an all-to-all network topology
@@ -79,46 +258,81 @@ def all_to_all_simulation(β: float, γ: float, N: int, T: int) -> tuple[list[in
     N : Total population size
     T : End time-step
     Returns:
-        s : list containing the count of susceptible agents at each time step
-        i : list containing the count of infected agents at each time step
-        r : list containing the count of recovered agents at each time step 
+        s : array containing the count of susceptible agents at each time step
+        i : array containing the count of infected agents at each time step
+        r : array containing the count of recovered agents at each time step 
+
+    """
+
+    s = np.empty(T + 1, np.int32)
+    i = np.empty(T + 1, np.int32)
+    r = np.empty(T + 1, np.int32)
+    _allToAllInto(s, i, r, β, γ, N, T, rng.integers(2**31 - 1))
+    return s, i, r
+
+def all_to_all_ensemble(β: float, γ: float, N: int, T: int, runs: int, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    runs independent all-to-all simulations in parallel
+
+    Parameters:
+
+    β : Transmission rate
+    γ : Recovery rate
+    N : Total population size
+    T : End time-step
+    runs : Number of simulation runs
+    seed : Base seed, run k is seeded with seed + k (drawn at random if None)
+
+    Returns:
+        S : (runs, T+1) array of susceptible counts, one row per run
+        I : (runs, T+1) array of infected counts, one row per run
+        R : (runs, T+1) array of recovered counts, one row per run
 
     """
 
+    if seed is None:
+        seed = rng.integers(2**31 - 1 - runs)
+
+    return _allToAllEnsemble(β, γ, N, T, runs, seed)
+
+@njit(parallel=True, cache=True)
+def _allToAllEnsemble(β, γ, N, T, runs, seed):
+    S = np.empty((runs, T + 1), np.int32)
+    I = np.empty((runs, T + 1), np.int32)
+    R = np.empty((runs, T + 1), np.int32)
+    for k in prange(runs):
+        _allToAllInto(S[k], I[k], R[k], β, γ, N, T, seed + k)
+    return S, I, R
+
+@njit(cache=True)
+def _allToAllInto(s, i, r, β, γ, N, T, seed):
+    # compiled simulation loop of the all-to-all model, writes the trajectories into s, i and r
+    np.random.seed(seed)
+
     t = 0
     # initialising the population with one infected individual and N-1 susceptible individuals
-    agents = (N-1) * ['S']
-    agents.append('I')
+    # every agent contacts every other agent, so only the compartment sizes matter
+    nS, nI, nR = N - 1, 1, 0
 
-    s = [N - 1]
-    i = [1]
-    r = [0]
+    s[0], i[0], r[0] = nS, nI, nR
 
     while t < T:
 
-        newAgents = copy.deepcopy(agents)
-
-        # loop through all agents
-        for i_ in range(N):
-            if agents[i_] == 'I':
-                # if the agent is infected, they come into contact with all other agents in the network and infect them with Probability β
-                for j in range(N):
-                    if j != i_ and agents[j] == 'S' and random.random() < β:
-                        newAgents[j] = 'I'
-                if random.random() < γ:
-                    newAgents[i_] = 'R'
-        
-        agents = newAgents
-
-        s.append(agents.count('S'))
-        i.append(agents.count('I'))
-        r.append(agents.count('R'))
-
-        assert agents.count('S') + agents.count('I') + agents.count('R') == N
-                
+        # every infected agent contacts every susceptible agent and infects them with probability β,
+        # so each susceptible agent escapes infection with probability (1-β)^nI
+        newInfections = np.random.binomial(nS, 1 - (1 - β) ** nI)
+        # each infected agent (from the start of the time step) recovers with probability γ
+        newRecoveries = np.random.binomial(nI, γ)
+
+        nS -= newInfections
+        nI += newInfections - newRecoveries
+        nR += newRecoveries
+
         t += 1
 
-    return s, i, r
+        s[t], i[t], r[t] = nS, nI, nR
+
+    assert nS + nI + nR == N
 
 
 runs = 50           
@@ -159,19 +373,8 @@ def plot_comparison(latticeData, allToAllData, title):
     plt.show()
 
 def run_comparison():
-    latticeSusceptible, latticeInfected, latticeRecovered = [], [], []
-    for _ in range(runs):
-        s, i, r = latticeSimulation(β, γ, grid_N, T)
-        latticeSusceptible.append(s)
-        latticeInfected.append(i)
-        latticeRecovered.append(r)
-    
-    allToAllSusceptible, allToAllInfected, allToAllRecovered = [], [], []
-    for _ in range(runs):
-        s, i, r = all_to_all_simulation(β, γ, population_N, T)
-        allToAllSusceptible.append(s)
-        allToAllInfected.append(i)
-        allToAllRecovered.append(r)
+    latticeSusceptible, latticeInfected, latticeRecovered = latticeEnsemble(β, γ, grid_N, T, runs)
+    allToAllSusceptible, allToAllInfected, allToAllRecovered = all_to_all_ensemble(β, γ, population_N, T, runs)
     
     latticeData = {
         'susceptible': np.mean(latticeSusceptible, axis=0),
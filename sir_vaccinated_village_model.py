@@ -1,10 +1,9 @@
-import random
 import numpy as np
 import matplotlib.pyplot as plt
-import copy
+from numba import njit, prange, get_num_threads
+from _kernels import SUSCEPTIBLE, INFECTED, RECOVERED, VACCINATED, stepTwoAgent
 
-
-def runVillageSimulation(β: float, γ: float, N: int, T: int, t: int = 0, v: int = 3) -> tuple[list[list[int]], list[list[int]], list[list[int]]]:
+def runVillageSimulation(β: float, γ: float, N: int, T: int, t: int = 0, v: int = 3, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Simulates the spread of an infectious disease in multiple villages, with the second village fully vaccinated.
     Vaccinated individuals are counted as susceptible but have half the chance of getting infected.
@@ -16,82 +15,136 @@ def runVillageSimulation(β: float, γ: float, N: int, T: int, t: int = 0, v: in
     T : End time-step
     t : Initial time-step
     v : Number of villages
+    seed : Seed for the random number generator (drawn at random if None)
+
+    Returns:
+        - sv: (T-t+1, v) array of susceptible counts (including vaccinated individuals) per village
+        - iv: (T-t+1, v) array of infected counts per village
+        - rv: (T-t+1, v) array of recovered counts per village
+    """
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+
+    sv = np.zeros((T - t + 1, v), np.int32)
+    iv = np.zeros((T - t + 1, v), np.int32)
+    rv = np.zeros((T - t + 1, v), np.int32)
+    _runInto(sv, iv, rv, β, γ, N, T, t, v, seed)
+    return sv, iv, rv
+
+
+def runVillageEnsemble(β: float, γ: float, N: int, T: int, numSimulations: int, t: int = 0, v: int = 3, seed: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Runs numSimulations independent simulations of the vaccinated village model in parallel and sums their counts.
+
+    Parameters:
+    β : Transmission rate
+    γ : Recovery rate
+    N : Total population size
+    T : End time-step
+    numSimulations : Number of simulation runs
+    t : Initial time-step
+    v : Number of villages
+    seed : Base seed, run k is seeded with seed + k (drawn at random if None)
 
     Returns:
-        - sv: Time series of susceptible counts (including vaccinated individuals) per village
-        - iv: Time series of infected counts per village
-        - rv: Time series of recovered counts per village
+        - sTotal: (T-t+1, v) array of susceptible counts (including vaccinated individuals) per village, summed over all runs
+        - iTotal: (T-t+1, v) array of infected counts per village, summed over all runs
+        - rTotal: (T-t+1, v) array of recovered counts per village, summed over all runs
     """
-    # Creating v villages with (N//v) agents each (all susceptible initially)
-    agents = [['S']*(N//v) for _ in range(v)]
+    if seed is None:
+        seed = np.random.randint(2**31 - 1 - numSimulations)
+
+    numChunks = min(get_num_threads(), numSimulations)
+    return _runEnsemble(β, γ, N, T, t, v, numSimulations, numChunks, seed)
+
+
+@njit(parallel=True, cache=True)
+def _runEnsemble(β, γ, N, T, t, v, numSimulations, numChunks, seed):
+    # the runs are split into numChunks interleaved chunks, each with its own accumulator,
+    # so chunks running on different threads never write to the same memory
+    sAcc = np.zeros((numChunks, T - t + 1, v))
+    iAcc = np.zeros((numChunks, T - t + 1, v))
+    rAcc = np.zeros((numChunks, T - t + 1, v))
+    for chunk in prange(numChunks):
+        for k in range(chunk, numSimulations, numChunks):
+            _runInto(sAcc[chunk], iAcc[chunk], rAcc[chunk], β, γ, N, T, t, v, seed + k)
+    return sAcc.sum(axis=0), iAcc.sum(axis=0), rAcc.sum(axis=0)
+
+
+@njit(cache=True)
+def _runInto(sAcc, iAcc, rAcc, β, γ, N, T, t, v, seed):
+    # compiled simulation loop, adds the counts of each village at each time step into sAcc, iAcc and rAcc
+    np.random.seed(seed)
+
+    # Creating v villages with (N//v) agents each (all susceptible initially).
+    # the villages are stored back to back, agent j of village k is at index k*(N//v) + j
+    agents = np.zeros(v * (N//v), np.uint8)
     
     # fully vaccinate the second village 
-    agents[1] = ['V']*(N//v)
+    agents[N//v:2 * (N//v)] = SUSCEPTIBLE | VACCINATED
     
     # randomly infect one agent in village 0
     randomVillage = 0  
-    randomAgent = random.randint(0, (N//v) - 1)
-    agents[randomVillage][randomAgent] = 'I'
+    randomAgent = np.random.randint(0, N//v)
+    agents[randomVillage * (N//v) + randomAgent] = INFECTED
+    
+    # running population counts per village (row k holds the S/I/R counts of village k), updated on each state transition
+    # vaccinated individuals are counted as susceptible
+    counts = np.zeros((v, 3), np.int32)
+    counts[:, SUSCEPTIBLE] = N//v
+    counts[randomVillage, SUSCEPTIBLE] -= 1
+    counts[randomVillage, INFECTED] += 1
     
     # track population counts per village over time
-    # vaccinated individuals ("V") are counted as susceptible
-    sv = [[row.count('S')+row.count('V') for row in agents]]
-    iv = [[row.count('I') for row in agents]]
-    rv = [[row.count('R') for row in agents]]
+    # row k of the accumulators collects the counts for the v villages k time steps after the start
+    startT = t
+    sAcc[0] += counts[:, SUSCEPTIBLE]
+    iAcc[0] += counts[:, INFECTED]
+    rAcc[0] += counts[:, RECOVERED]
     
     while t < T:
-        newAgents = copy.deepcopy(agents)
-        
         # Select first agent
-        randomAgent1VillageIdx = random.randint(0, v-1)
-        randomAgent1Idx = random.randint(0, (N//v)-1)
+        randomAgent1VillageIdx = np.random.randint(0, v)
+        randomAgent1Idx = np.random.randint(0, N//v)
         
         # Select a second agent with 10% probability from a different village; otherwise, same village.
-        if random.random() < 0.1:
-            randomAgent2VillageIdx = random.randint(0, v-1)
-            randomAgent2Idx = random.randint(0, (N//v)-1)
+        if np.random.random() < 0.1:
+            randomAgent2VillageIdx = np.random.randint(0, v)
+            randomAgent2Idx = np.random.randint(0, N//v)
         else:
             randomAgent2VillageIdx = randomAgent1VillageIdx
-            possibleIndices = list(range(N//v))
+            # a different agent from the same village, drawn uniformly from the other (N//v) - 1 agents
             if (N//v) > 1:
-                possibleIndices.remove(randomAgent1Idx)
-            randomAgent2Idx = random.choice(possibleIndices)
-        
-        randomAgent1 = agents[randomAgent1VillageIdx][randomAgent1Idx]
-        randomAgent2 = agents[randomAgent2VillageIdx][randomAgent2Idx]
-        
-        # Infection process:
-        # If one agent is infected and the other is either susceptible or vaccinated,
-        # apply infection probability accordingly.
-        if randomAgent1 =='I' and randomAgent2 in ['S', 'V']:
-            # full probability if target is "S"; half if "V".
-            prob = β if randomAgent2 == 'S' else β/2
-            if random.random() < prob:
-                newAgents[randomAgent2VillageIdx][randomAgent2Idx] = 'I'
-        elif randomAgent2 == 'I' and randomAgent1 in ['S', 'V']:
-            prob = β if randomAgent1 == 'S' else β/2
-            if random.random() < prob:
-                newAgents[randomAgent1VillageIdx][randomAgent1Idx] = 'I'
+                randomAgent2Idx = np.random.randint(0, (N//v) - 1)
+                if randomAgent2Idx >= randomAgent1Idx:
+                    randomAgent2Idx += 1
+            else:
+                randomAgent2Idx = randomAgent1Idx
         
         # Recovery process: randomly select an agent for potential recovery.
-        randomRecoveryVillage = random.randint(0, v-1)
-        randomRecoveryAgent = random.randint(0, (N // v)-1)
-        if agents[randomRecoveryVillage][randomRecoveryAgent] == 'I' and random.random() < γ:
-            newAgents[randomRecoveryVillage][randomRecoveryAgent] = 'R'
+        randomRecoveryVillage = np.random.randint(0, v)
+        randomRecoveryAgent = np.random.randint(0, N//v)
+        
+        # Infection process: if one agent is infected and the other is susceptible, infect it
+        # with full probability if it is unvaccinated and half if it is vaccinated.
+        # Recovery happens with probability γ for everyone; an agent infected in this step cannot recover until the next one.
+        stepTwoAgent(agents, counts, N//v,
+                     randomAgent1VillageIdx * (N//v) + randomAgent1Idx,
+                     randomAgent2VillageIdx * (N//v) + randomAgent2Idx,
+                     randomRecoveryVillage * (N//v) + randomRecoveryAgent,
+                     np.random.random(), np.random.random(),
+                     β, γ, β/2, γ)
         
-        agents = newAgents
         t+=1
         
         # Update population counts per village (treat vaccinated as susceptible)
-        sv.append([row.count('S') + row.count('V') for row in agents])
-        iv.append([row.count('I') for row in agents])
-        rv.append([row.count('R') for row in agents])
-        
-        # total population should stay constant otherwise there is a logical error somewhere.
-        totalPopulation = sum(row.count('S') + row.count('I') + row.count('R') + row.count('V') for row in agents)
-        assert totalPopulation == N
+        sAcc[t - startT] += counts[:, SUSCEPTIBLE]
+        iAcc[t - startT] += counts[:, INFECTED]
+        rAcc[t - startT] += counts[:, RECOVERED]
     
-    return sv, iv, rv
+    # total population should stay constant otherwise there is a logical error somewhere.
+    totalPopulation = counts.sum()
+    assert totalPopulation == N
 
 
 β = 0.6 # transmission rate.
@@ -102,15 +155,7 @@ v = 3 # number of villages.
 numSimulations = 50  # number of simulation runs.
 
 # averaging over simulations
-sTotal = np.zeros((T+1, v))
-iTotal = np.zeros((T+1, v))
-rTotal = np.zeros((T+1, v))
-
-for sim in range(numSimulations):
-    sv, iv, rv = runVillageSimulation(β, γ, N, T, t=0, v=v)
-    sTotal += np.array(sv)
-    iTotal += np.array(iv)
-    rTotal += np.array(rv)
+sTotal, iTotal, rTotal = runVillageEnsemble(β, γ, N, T, numSimulations, t=0, v=v)
 
 sAvg = sTotal/numSimulations
 iAvg = iTotal/numSimulations